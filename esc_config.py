@@ -33,6 +33,9 @@ num_workers = 8
 lr_scheduler_epoch = [10,20,30]
 lr_rate = [0.02, 0.05, 0.1]
 
+precision = "fp32" # "fp32" "bf16" "bf16-mixed" , bf16 runs the backbone under autocast on Ampere+ GPUs
+inference_dtype = "fp32" # "fp32" "bf16" , cast the backbone weights to bf16 on the pure inference paths (no autocast overhead)
+
 # these data preparation optimizations do not bring many improvements, so deprecated
 enable_token_label = False # token label
 class_map_path = "class_hier_map.npy"
@@ -48,6 +51,9 @@ enable_repeat_mode = False # repeat the spectrogram / reshape the spectrogram
 
 # for model's design
 enable_tscam = True # enbale the token-semantic layer
+enable_compile = False # wrap the backbone with torch.compile (needs torch >= 2.0), the input shapes are fixed so inductor can specialize
+enable_cudnn_benchmark = True # let cudnn autotune the conv algos once, the input shapes are fixed each run
+enable_channels_last = False # channels_last memory format, mainly pays off for conv backbones (e.g. Cnn14)
 
 # for signal processing
 sample_rate = 32000 # 16000 for scv2, 32000 for audioset and esc-50
@@ -104,6 +110,7 @@ esm_model_pathes = [
 
 # for framewise localization
 heatmap_dir = "/home/Research/heatmap_output"
+heatmap_dtype = "fp16" # "fp16" "fp32" , fp16 halves the D2H traffic and the saved file size
 test_file = "htsat-test-ensemble"
 fl_local = False # indicate if we need to use this dataset for the framewise detection
 fl_dataset = "/home/Research/desed/desed_eval.npy"  
@@ -50,16 +50,18 @@ def label_enhance(preds):
 def process(f_dir, f_name, f_class, f_map):
     # load data
     f_idx = 0
-    rf_name = os.path.join(f_dir, f_name + "_cuda:" + str(f_idx) + ".npy")
-    load_file = []
+    rf_name = os.path.join(f_dir, f_name + "_cuda:" + str(f_idx) + ".npz")
+    shards = []
     while os.path.exists(rf_name):
-        load_file.append(np.load(rf_name, allow_pickle = True))
+        rf = np.load(rf_name, allow_pickle = True)
+        hm_name = os.path.join(f_dir, f_name + "_cuda:" + str(f_idx) + "_heatmap.npy")
+        # the heatmaps stay on disk, mmap them instead of loading everything
+        shards.append((rf["audio_name"], rf["real_len"], np.load(hm_name, mmap_mode = "r")))
         print("Load:", rf_name)
         f_idx += 1
-        rf_name = os.path.join(f_dir, f_name + "_cuda:" + str(f_idx) + ".npy")
-    load_file = np.concatenate(load_file, axis = 0)
-    print(len(load_file))
-    print(load_file[0]["heatmap"].shape)
+        rf_name = os.path.join(f_dir, f_name + "_cuda:" + str(f_idx) + ".npz")
+    print(sum(len(s[0]) for s in shards))
+    print(shards[0][2][0].shape)
     output_maps = {
         "filename": [],
         "onset":[],
@@ -70,19 +72,20 @@ def process(f_dir, f_name, f_class, f_map):
         "filename": [],
         "duration": []
     }
-    for d in tqdm(load_file):
-        audio_name = d["audio_name"]
-        real_len = math.ceil(d["real_len"] // config.hop_size * 1.024) # add ratio
-        pred_map = d["heatmap"][:real_len]
-        pred_map = fl_mapping(pred_map, f_map)
-        output_map = draw_timeline(pred_map, f_class)
-        for ops in output_map:
-            output_maps["filename"].append(audio_name)
-            output_maps["onset"].append(ops[0])
-            output_maps["offset"].append(ops[1])
-            output_maps["event_label"].append(ops[2])
-        meta_maps["filename"].append(audio_name)
-        meta_maps["duration"].append(d["real_len"] / config.sample_rate)
+    for audio_names, real_lens, heatmaps in shards:
+        for i in tqdm(range(len(audio_names))):
+            audio_name = audio_names[i]
+            real_len = math.ceil(real_lens[i] // config.hop_size * 1.024) # add ratio
+            pred_map = np.array(heatmaps[i][:real_len])
+            pred_map = fl_mapping(pred_map, f_map)
+            output_map = draw_timeline(pred_map, f_class)
+            for ops in output_map:
+                output_maps["filename"].append(audio_name)
+                output_maps["onset"].append(ops[0])
+                output_maps["offset"].append(ops[1])
+                output_maps["event_label"].append(ops[2])
+            meta_maps["filename"].append(audio_name)
+            meta_maps["duration"].append(real_lens[i] / config.sample_rate)
     q_filename = os.path.join(f_dir, f_name + "_outputmap.tsv")
     m_filename = os.path.join(f_dir, f_name + "_meta.tsv")
     q = pd.DataFrame(
@@ -126,6 +126,7 @@ def esm_test():
     audioset_data = data_prep(eval_dataset, eval_dataset, device_num)
     trainer = pl.Trainer(
         deterministic=True,
+        benchmark = config.enable_cudnn_benchmark,
         gpus = device_num, 
         max_epochs = config.max_epoch,
         auto_lr_find = True,    
@@ -210,6 +211,7 @@ def test():
     audioset_data = data_prep(eval_dataset, eval_dataset, device_num)
     trainer = pl.Trainer(
         deterministic=True,
+        benchmark = config.enable_cudnn_benchmark,
         gpus = device_num, 
         max_epochs = config.max_epoch,
         auto_lr_find = True,    
@@ -329,6 +331,7 @@ def train():
         )
     trainer = pl.Trainer(
         deterministic=True,
+        benchmark = config.enable_cudnn_benchmark,
         default_root_dir = checkpoint_dir,
         gpus = device_num, 
         val_check_interval = 0.1,
@@ -580,7 +580,10 @@ class HTSAT_Swin_Transformer(nn.Module):
         #     hier_x = []
         #     hier_attn = []
 
-        frames_num = x.shape[2]        
+        frames_num = x.shape[2]
+        if self.config.enable_channels_last:
+            # tensor-core friendly layout for the conv patch embedding
+            x = x.to(memory_format=torch.channels_last)
         x = self.patch_embed(x)
         if self.ape:
             x = x + self.absolute_pos_embed
@@ -771,7 +774,10 @@ class HTSAT_Swin_Transformer(nn.Module):
             x = self.spec_augmenter(x)
         if self.training and mixup_lambda is not None:
             x = do_mixup(x, mixup_lambda)
-        
+
+        # the stft/mel front-end always runs in fp32, align with the backbone dtype here
+        x = x.to(self.patch_embed.proj.weight.dtype)
+
         if infer_mode:
             # in infer mode. we need to handle different length audio input
             frame_num = x.shape[2]
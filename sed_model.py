@@ -6,59 +6,208 @@ import bisect
 import torch.optim as optim
 import torch.distributed as dist
 import pytorch_lightning as pl
-from sklearn.metrics import average_precision_score, roc_auc_score, accuracy_score
-from utils import get_loss_func, get_mix_lambda, d_prime
+from sklearn.metrics import accuracy_score
+from utils import get_loss_func, d_prime, batched_average_precision, batched_roc_auc
+
+def cast_bf16_inference(sed_model):
+    # cast the backbone weights to bf16 for pure inference
+    # the stft/mel front-end is numerically sensitive, so it stays in fp32
+    # (the model casts the mel output to the backbone dtype by itself)
+    sed_model = sed_model.to(torch.bfloat16)
+    for name in ["spectrogram_extractor", "logmel_extractor", "bn0"]:
+        if hasattr(sed_model, name):
+            getattr(sed_model, name).float()
+    return sed_model
+
+def build_lr_lambda(config):
+    # precompute the warmup/decay scale for every epoch once; LambdaLR calls
+    # the lambda on every scheduler step, so keep it a table lookup instead
+    # of bisect + pow each time
+    lr_table = []
+    for epoch in range(config.max_epoch):
+        if epoch < 3:
+            lr_scale = config.lr_rate[epoch]
+        else:
+            lr_pos = int(-1 - bisect.bisect_left(config.lr_scheduler_epoch, epoch))
+            if lr_pos < -3:
+                lr_scale = max(config.lr_rate[0] * (0.98 ** epoch), 0.03)
+            else:
+                lr_scale = config.lr_rate[lr_pos]
+        lr_table.append(lr_scale)
+    return lambda epoch: lr_table[min(epoch, len(lr_table) - 1)]
+
+def write_heatmap_shard(module, pred_map):
+    # stream each test batch straight into an on-disk .npy memmap instead of
+    # holding every heatmap on the CPU heap and concatenating at epoch end
+    if module.heatmap_mmap is None:
+        if dist.is_available() and dist.is_initialized():
+            shard_len = (len(module.dataset) + dist.get_world_size() - 1) // dist.get_world_size()
+        else:
+            shard_len = len(module.dataset)
+        heatmap_file = os.path.join(module.config.heatmap_dir,
+            module.config.test_file + "_" + str(module.device_type) + "_heatmap.npy")
+        module.heatmap_mmap = np.lib.format.open_memmap(
+            heatmap_file, mode="w+", dtype=pred_map.dtype,
+            shape=(shard_len,) + tuple(pred_map.shape[1:]))
+    module.heatmap_mmap[module.heatmap_offset:module.heatmap_offset + len(pred_map)] = pred_map
+    module.heatmap_offset += len(pred_map)
+
+def finish_heatmap_shard(module):
+    if module.heatmap_mmap is not None:
+        module.heatmap_mmap.flush()
+        module.heatmap_mmap = None
+    module.heatmap_offset = 0
+
+def evaluate_on_rank_zero(module, pred, target):
+    # the gathered tensors are identical on every rank, so run the expensive
+    # per-class metrics once on rank 0 and broadcast the scalar results
+    # (nccl has no gather-to-root, so the data is still all-gathered — only
+    # the duplicated metric computation is removed)
+    keys = ["mAP", "mAUC", "dprime"] if module.config.dataset_type == "audioset" else ["acc"]
+    if dist.get_rank() == 0:
+        metric_dict = module.evaluate_metric(pred.cpu().numpy(), target.cpu().numpy())
+        values = torch.tensor([metric_dict[key] for key in keys], dtype=torch.float64, device=pred.device)
+    else:
+        values = torch.zeros(len(keys), dtype=torch.float64, device=pred.device)
+    dist.broadcast(values, src=0)
+    return {key: values[i].item() for i, key in enumerate(keys)}
+
+def all_gather_flat(tensor):
+    # gather across ranks into one pre-allocated flat buffer instead of a list
+    # of per-rank tensors, saving the internal flatten/unflatten copies
+    tensor = tensor.contiguous()
+    gather_buf = torch.empty(
+        (dist.get_world_size() * tensor.shape[0],) + tuple(tensor.shape[1:]),
+        dtype=tensor.dtype, device=tensor.device
+    )
+    dist._all_gather_base(gather_buf, tensor)
+    return gather_buf
+
+def all_gather_pred_target(pred, target):
+    # coalesce pred and target into one collective, so the launch latency is
+    # paid once and NCCL can pipeline one larger transfer
+    pred_dim = pred[0].numel()
+    combined = torch.cat([
+        pred.reshape(len(pred), -1),
+        target.reshape(len(target), -1).to(pred.dtype)
+    ], dim=1)
+    combined = all_gather_flat(combined)
+    gather_pred = combined[:, :pred_dim].reshape((-1,) + tuple(pred.shape[1:]))
+    gather_target = combined[:, pred_dim:].reshape((-1,) + tuple(target.shape[1:])).to(target.dtype)
+    return gather_pred, gather_target
 
 class SEDWrapper(pl.LightningModule):
     def __init__(self, sed_model, config, dataset):
         super().__init__()
         self.sed_model = sed_model
+        if config.enable_channels_last:
+            self.sed_model = self.sed_model.to(memory_format=torch.channels_last)
         self.config = config
         self.dataset = dataset
         self.loss_func = get_loss_func(config.loss_type)
-        self.training_step_outputs = []
+        self.train_loss_sum = None
+        self.train_loss_count = 0
         self.validation_step_outputs = []
+        self.bf16_casted = False
+        self.mix_beta = None
+        self.pinned_in = None
+        self.heatmap_mmap = None
+        self.heatmap_offset = 0
+        self.backbone_forward = None
 
     def evaluate_metric(self, pred, ans):
         if self.config.dataset_type == "audioset":
-            mAP = np.mean(average_precision_score(ans, pred, average=None))
-            mAUC = np.mean(roc_auc_score(ans, pred, average=None))
+            mAP = np.mean(batched_average_precision(ans, pred))
+            mAUC = np.mean(batched_roc_auc(ans, pred))
             dprime = d_prime(mAUC)
             return {"mAP": mAP, "mAUC": mAUC, "dprime": dprime}
         else:
             acc = accuracy_score(ans, np.argmax(pred, 1))
             return {"acc": acc}
 
+    def run_backbone(self, *args):
+        # lazily torch.compile the backbone forward: the first call happens
+        # after the checkpoint load in main.py, so the state_dict keys keep
+        # their unprefixed names
+        if self.backbone_forward is None:
+            if self.config.enable_compile and hasattr(torch, "compile"):
+                self.backbone_forward = torch.compile(self.sed_model.forward, mode="max-autotune", dynamic=False)
+            else:
+                self.backbone_forward = self.sed_model.forward
+        return self.backbone_forward(*args)
+
     def forward(self, x, mix_lambda=None):
-        output_dict = self.sed_model(x, mix_lambda)
-        return output_dict["clipwise_output"], output_dict["framewise_output"]
+        if self.config.precision == "fp32":
+            output_dict = self.run_backbone(x, mix_lambda)
+        else:
+            with torch.amp.autocast(device_type="cuda", dtype=torch.bfloat16):
+                output_dict = self.run_backbone(x, mix_lambda)
+        # keep the loss and the metrics in fp32
+        return output_dict["clipwise_output"].float(), output_dict["framewise_output"].float()
 
     def inference(self, x):
         self.device_type = next(self.parameters()).device
         self.eval()
-        x = torch.from_numpy(x).float().to(self.device_type)
-        output_dict = self.sed_model(x, None, True)
+        if self.config.inference_dtype == "bf16" and not self.bf16_casted:
+            self.sed_model = cast_bf16_inference(self.sed_model)
+            self.bf16_casted = True
+        x = torch.from_numpy(x).float()
+        if self.device_type.type == "cuda":
+            # stage through a reusable pinned buffer so the H2D copy is a
+            # non-blocking DMA instead of a synchronous pageable copy
+            if self.pinned_in is None or self.pinned_in.numel() < x.numel():
+                self.pinned_in = torch.empty(x.numel(), pin_memory=True)
+            pinned = self.pinned_in[:x.numel()].view(x.shape)
+            pinned.copy_(x)
+            x = pinned.to(self.device_type, non_blocking=True)
+        else:
+            x = x.to(self.device_type)
+        if self.config.precision == "fp32":
+            output_dict = self.run_backbone(x, None, True)
+        else:
+            with torch.amp.autocast(device_type="cuda", dtype=torch.bfloat16):
+                output_dict = self.run_backbone(x, None, True)
+        # copy all outputs back through pinned buffers, then sync once
         for key in output_dict.keys():
-            output_dict[key] = output_dict[key].detach().cpu().numpy()
+            buf = torch.empty(output_dict[key].shape, dtype=torch.float32,
+                pin_memory=(self.device_type.type == "cuda"))
+            buf.copy_(output_dict[key].float().detach(), non_blocking=True)
+            output_dict[key] = buf
+        if self.device_type.type == "cuda":
+            torch.cuda.synchronize(self.device_type)
+        for key in output_dict.keys():
+            output_dict[key] = output_dict[key].numpy()
         return output_dict
 
     def training_step(self, batch, batch_idx):
         self.device_type = next(self.parameters()).device
         if self.config.dataset_type == "audioset":
-            mix_lambda = torch.from_numpy(get_mix_lambda(0.5, len(batch["waveform"]))).to(self.device_type)
+            # sample the mixup lambdas directly on device, no numpy round-trip
+            # and no synchronous H2D copy every step
+            if self.mix_beta is None:
+                alpha = torch.tensor(0.5, device=self.device_type)
+                self.mix_beta = torch.distributions.Beta(alpha, alpha)
+            mix_lambda = self.mix_beta.sample((len(batch["waveform"]),))
         else:
             mix_lambda = None
 
         pred, _ = self(batch["waveform"], mix_lambda)
         loss = self.loss_func(pred, batch["target"])
-        self.training_step_outputs.append(loss)
+        # running sum as a 0-d device tensor: no list of retained step losses
+        # and no per-step .item() sync
+        if self.train_loss_sum is None:
+            self.train_loss_sum = torch.zeros_like(loss.detach())
+        self.train_loss_sum += loss.detach()
+        self.train_loss_count += 1
         self.log("loss", loss, on_epoch=True, prog_bar=True)
         return loss
 
     def on_train_epoch_end(self):
-        epoch_average = torch.stack(self.training_step_outputs).mean()
-        self.log("training_epoch_average", epoch_average)
-        self.training_step_outputs.clear()  # free memory
+        if self.train_loss_count > 0:
+            epoch_average = self.train_loss_sum / self.train_loss_count
+            self.log("training_epoch_average", epoch_average)
+        self.train_loss_sum = None
+        self.train_loss_count = 0
         self.dataset.generate_queue()
 
     def validation_step(self, batch, batch_idx):
@@ -69,21 +218,16 @@ class SEDWrapper(pl.LightningModule):
         self.device_type = next(self.parameters()).device
         pred = torch.cat([d[0] for d in validation_step_outputs], dim=0)
         target = torch.cat([d[1] for d in validation_step_outputs], dim=0)
+        if self.config.dataset_type == "scv2":
+            # decode the one-hot target on GPU before the gather, shrinking
+            # the collective payload from (N, C) to (N,)
+            target = target.argmax(dim=1)
 
         if torch.cuda.device_count() > 1:
-            gather_pred = [torch.zeros_like(pred) for _ in range(dist.get_world_size())]
-            gather_target = [torch.zeros_like(target) for _ in range(dist.get_world_size())]
-            dist.all_gather(gather_pred, pred)
-            dist.all_gather(gather_target, target)
-            gather_pred = torch.cat(gather_pred, dim=0).cpu().numpy()
-            gather_target = torch.cat(gather_target, dim=0).cpu().numpy()
+            gather_pred, gather_target = all_gather_pred_target(pred, target)
+            metric_dict = evaluate_on_rank_zero(self, gather_pred, gather_target)
         else:
-            gather_pred = pred.cpu().numpy()
-            gather_target = target.cpu().numpy()
-
-        if self.config.dataset_type == "scv2":
-            gather_target = np.argmax(gather_target, 1)
-        metric_dict = self.evaluate_metric(gather_pred, gather_target)
+            metric_dict = self.evaluate_metric(pred.cpu().numpy(), target.cpu().numpy())
         print(self.device_type, metric_dict, flush=True)
 
         if self.config.dataset_type == "audioset":
@@ -95,41 +239,50 @@ class SEDWrapper(pl.LightningModule):
 
     def test_step(self, batch, batch_idx):
         self.device_type = next(self.parameters()).device
-        preds = []
+        x = batch["waveform"]
         shift_num = 1 if self.config.fl_local or self.config.dataset_type != "audioset" else 10
-        for i in range(shift_num):
-            pred, pred_map = self(batch["waveform"])
-            preds.append(pred.unsqueeze(0))
-            batch["waveform"] = self.time_shifting(batch["waveform"], shift_len=100 * (i + 1))
-        preds = torch.cat(preds, dim=0)
-        pred = preds.mean(dim=0)
+        if shift_num == 1:
+            pred, pred_map = self(x)
+        else:
+            # stack all time shifts into the batch axis and run one forward
+            # instead of shift_num serial model calls
+            shifted = [x]
+            for i in range(shift_num - 1):
+                shifted.append(self.time_shifting(shifted[-1], shift_len=100 * (i + 1)))
+            preds, _ = self(torch.cat(shifted, dim=0))
+            pred = preds.reshape((shift_num, len(x)) + preds.shape[1:]).mean(dim=0)
         if self.config.fl_local:
-            return [pred.detach().cpu().numpy(), pred_map.detach().cpu().numpy(), batch["audio_name"], batch["real_len"].cpu().numpy()]
+            if self.config.heatmap_dtype == "fp16":
+                # halve the D2H transfer and the saved heatmap size
+                pred_map = pred_map.half()
+            write_heatmap_shard(self, pred_map.detach().cpu().numpy())
+            return [pred.detach().cpu().numpy(), batch["audio_name"], batch["real_len"].cpu().numpy()]
         else:
             return [pred.detach(), batch["target"].detach()]
 
+    def on_test_start(self):
+        self.heatmap_mmap = None
+        self.heatmap_offset = 0
+
     def test_epoch_end(self, test_step_outputs):
         self.device_type = next(self.parameters()).device
         if self.config.fl_local:
             pred = np.concatenate([d[0] for d in test_step_outputs], axis=0)
-            pred_map = np.concatenate([d[1] for d in test_step_outputs], axis=0)
-            audio_name = np.concatenate([d[2] for d in test_step_outputs], axis=0)
-            real_len = np.concatenate([d[3] for d in test_step_outputs], axis=0)
-            heatmap_file = os.path.join(self.config.heatmap_dir, self.config.test_file + "_" + str(self.device_type) + ".npy")
-            save_npy = [{"audio_name": audio_name[i], "heatmap": pred_map[i], "pred": pred[i], "real_len": real_len[i]} for i in range(len(pred))]
-            np.save(heatmap_file, save_npy)
+            audio_name = np.concatenate([d[1] for d in test_step_outputs], axis=0)
+            real_len = np.concatenate([d[2] for d in test_step_outputs], axis=0)
+            heatmap_file = os.path.join(self.config.heatmap_dir, self.config.test_file + "_" + str(self.device_type) + ".npz")
+            # the heatmaps are already on disk in the companion _heatmap.npy memmap
+            np.savez(heatmap_file, audio_name=audio_name, pred=pred, real_len=real_len)
+            finish_heatmap_shard(self)
         else:
             pred = torch.cat([d[0] for d in test_step_outputs], dim=0)
             target = torch.cat([d[1] for d in test_step_outputs], dim=0)
-            gather_pred = [torch.zeros_like(pred) for _ in range(dist.get_world_size())]
-            gather_target = [torch.zeros_like(target) for _ in range(dist.get_world_size())]
-            dist.all_gather(gather_pred, pred)
-            dist.all_gather(gather_target, target)
-            gather_pred = torch.cat(gather_pred, dim=0).cpu().numpy()
-            gather_target = torch.cat(gather_target, dim=0).cpu().numpy()
             if self.config.dataset_type == "scv2":
-                gather_target = np.argmax(gather_target, 1)
-            metric_dict = self.evaluate_metric(gather_pred, gather_target)
+                # decode the one-hot target on GPU before the gather, shrinking
+                # the collective payload from (N, C) to (N,)
+                target = target.argmax(dim=1)
+            gather_pred, gather_target = all_gather_pred_target(pred, target)
+            metric_dict = evaluate_on_rank_zero(self, gather_pred, gather_target)
             print(self.device_type, dist.get_world_size(), metric_dict, flush=True)
             if self.config.dataset_type == "audioset":
                 self.log("mAP", metric_dict["mAP"] * float(dist.get_world_size()), on_epoch=True, prog_bar=True, sync_dist=True)
@@ -139,9 +292,8 @@ class SEDWrapper(pl.LightningModule):
                 self.log("acc", metric_dict["acc"] * float(dist.get_world_size()), on_epoch=True, prog_bar=True, sync_dist=True)
 
     def time_shifting(self, x, shift_len):
-        shift_len = int(shift_len)
-        new_sample = torch.cat([x[:, shift_len:], x[:, :shift_len]], axis=1)
-        return new_sample
+        # one contiguous copy, no slice + concat intermediates
+        return torch.roll(x, shifts=-int(shift_len), dims=1)
 
     def configure_optimizers(self):
         optimizer = optim.AdamW(
@@ -149,19 +301,9 @@ class SEDWrapper(pl.LightningModule):
             lr=self.config.learning_rate, 
             betas=(0.9, 0.999), eps=1e-08, weight_decay=0.05
         )
-        def lr_foo(epoch):       
-            if epoch < 3:
-                lr_scale = self.config.lr_rate[epoch]
-            else:
-                lr_pos = int(-1 - bisect.bisect_left(self.config.lr_scheduler_epoch, epoch))
-                if lr_pos < -3:
-                    lr_scale = max(self.config.lr_rate[0] * (0.98 ** epoch), 0.03)
-                else:
-                    lr_scale = self.config.lr_rate[lr_pos]
-            return lr_scale
         scheduler = optim.lr_scheduler.LambdaLR(
             optimizer,
-            lr_lambda=lr_foo
+            lr_lambda=build_lr_lambda(self.config)
         )
         return [optimizer], [scheduler]
 
@@ -171,80 +313,117 @@ class Ensemble_SEDWrapper(pl.LightningModule):
         self.sed_models = nn.ModuleList(sed_models)
         self.config = config
         self.dataset = dataset
+        if config.inference_dtype == "bf16":
+            for wrapper in self.sed_models:
+                wrapper.sed_model = cast_bf16_inference(wrapper.sed_model)
+        self.stacked_state = None
+        self.heatmap_mmap = None
+        self.heatmap_offset = 0
 
     def evaluate_metric(self, pred, ans):
         if self.config.dataset_type == "audioset":
-            mAP = np.mean(average_precision_score(ans, pred, average=None))
-            mAUC = np.mean(roc_auc_score(ans, pred, average=None))
+            mAP = np.mean(batched_average_precision(ans, pred))
+            mAUC = np.mean(batched_roc_auc(ans, pred))
             dprime = d_prime(mAUC)
             return {"mAP": mAP, "mAUC": mAUC, "dprime": dprime}
         else:
             acc = accuracy_score(ans, np.argmax(pred, 1))
             return {"acc": acc}
         
+    def shift_batch(self, x):
+        # stack all time shifts into the batch axis so one forward covers them
+        shift_num = 1 if self.config.fl_local or self.config.dataset_type != "audioset" else 10
+        if shift_num == 1:
+            return x, 1
+        shifted = [x]
+        for i in range(shift_num - 1):
+            shifted.append(self.time_shifting(shifted[-1], shift_len=100 * (i + 1)))
+        return torch.cat(shifted, dim=0), shift_num
+
     def forward(self, x, sed_index, mix_lambda=None):
         self.sed_models[sed_index].eval()
-        preds = [] 
-        pred_maps = []
-        shift_num = 1 if self.config.fl_local or self.config.dataset_type != "audioset" else 10
-        for i in range(shift_num):
-            pred, pred_map = self.sed_models[sed_index](x)
-            pred_maps.append(pred_map.unsqueeze(0))
-            preds.append(pred.unsqueeze(0))
-            x = self.time_shifting(x, shift_len=100 * (i + 1))
-        preds = torch.cat(preds, dim=0)
-        pred_maps = torch.cat(pred_maps, dim=0)
-        pred = preds.mean(dim=0)
-        pred_map = pred_maps.mean(dim=0)
+        x, shift_num = self.shift_batch(x)
+        preds, pred_maps = self.sed_models[sed_index](x)
+        if shift_num == 1:
+            return preds, pred_maps
+        pred = preds.reshape((shift_num, -1) + preds.shape[1:]).mean(dim=0)
+        pred_map = pred_maps.reshape((shift_num, -1) + pred_maps.shape[1:]).mean(dim=0)
         return pred, pred_map
 
     def time_shifting(self, x, shift_len):
-        shift_len = int(shift_len)
-        new_sample = torch.cat([x[:, shift_len:], x[:, :shift_len]], axis=1)
-        return new_sample
+        # one contiguous copy, no slice + concat intermediates
+        return torch.roll(x, shifts=-int(shift_len), dims=1)
+
+    def ensemble_forward(self, x):
+        # mean prediction over all ensemble members: when torch.func is
+        # available and the members share one architecture, the stacked
+        # weights run in a single vmapped forward instead of one serial
+        # model call per member
+        if self.stacked_state is None:
+            try:
+                from torch.func import stack_module_state
+                self.sed_models.eval()
+                self.stacked_state = stack_module_state(list(self.sed_models))
+            except (ImportError, RuntimeError):
+                self.stacked_state = False
+        if self.stacked_state is False:
+            all_preds = []
+            all_maps = []
+            for j in range(len(self.sed_models)):
+                temp_pred, temp_pred_map = self(x, j)
+                all_preds.append(temp_pred)
+                all_maps.append(temp_pred_map)
+            # one reduction pass instead of M accumulator read/writes
+            return torch.stack(all_preds).mean(dim=0), torch.stack(all_maps).mean(dim=0)
+        from torch.func import functional_call, vmap
+        params, buffers = self.stacked_state
+        x, shift_num = self.shift_batch(x)
+        base_model = self.sed_models[0]
+        def call_one(p, b):
+            return functional_call(base_model, (p, b), (x,))
+        preds, pred_maps = vmap(call_one)(params, buffers)
+        pred = preds.mean(dim=0)
+        pred_map = pred_maps.mean(dim=0)
+        if shift_num > 1:
+            pred = pred.reshape((shift_num, -1) + pred.shape[1:]).mean(dim=0)
+            pred_map = pred_map.reshape((shift_num, -1) + pred_map.shape[1:]).mean(dim=0)
+        return pred, pred_map
 
     def test_step(self, batch, batch_idx):
         self.device_type = next(self.parameters()).device
+        pred, pred_map = self.ensemble_forward(batch["waveform"])
         if self.config.fl_local:
-            pred = torch.zeros(len(batch["waveform"]), self.config.classes_num).float().to(self.device_type)
-            pred_map = torch.zeros(len(batch["waveform"]), 1024, self.config.classes_num).float().to(self.device_type)
-            for j in range(len(self.sed_models)):
-                temp_pred, temp_pred_map = self(batch["waveform"], j)
-                pred = pred + temp_pred
-                pred_map = pred_map + temp_pred_map 
-            pred = pred / len(self.sed_models)
-            pred_map = pred_map / len(self.sed_models)
-            return [pred.detach().cpu().numpy(), pred_map.detach().cpu().numpy(), batch["audio_name"], batch["real_len"].cpu().numpy()]
+            if self.config.heatmap_dtype == "fp16":
+                # halve the D2H transfer and the saved heatmap size
+                pred_map = pred_map.half()
+            write_heatmap_shard(self, pred_map.detach().cpu().numpy())
+            return [pred.detach().cpu().numpy(), batch["audio_name"], batch["real_len"].cpu().numpy()]
         else:
-            pred = torch.zeros(len(batch["waveform"]), self.config.classes_num).float().to(self.device_type)
-            for j in range(len(self.sed_models)):
-                temp_pred, _ = self(batch["waveform"], j)
-                pred = pred + temp_pred
-            pred = pred / len(self.sed_models)
             return [pred.detach(), batch["target"].detach()]
 
+    def on_test_start(self):
+        self.heatmap_mmap = None
+        self.heatmap_offset = 0
+
     def test_epoch_end(self, test_step_outputs):
         self.device_type = next(self.parameters()).device
         if self.config.fl_local:
             pred = np.concatenate([d[0] for d in test_step_outputs], axis=0)
-            pred_map = np.concatenate([d[1] for d in test_step_outputs], axis=0)
-            audio_name = np.concatenate([d[2] for d in test_step_outputs], axis=0)
-            real_len = np.concatenate([d[3] for d in test_step_outputs], axis=0)
-            heatmap_file = os.path.join(self.config.heatmap_dir, self.config.test_file + "_" + str(self.device_type) + ".npy")
-            save_npy = [{"audio_name": audio_name[i], "heatmap": pred_map[i], "pred": pred[i], "real_len": real_len[i]} for i in range(len(pred))]
-            np.save(heatmap_file, save_npy)
+            audio_name = np.concatenate([d[1] for d in test_step_outputs], axis=0)
+            real_len = np.concatenate([d[2] for d in test_step_outputs], axis=0)
+            heatmap_file = os.path.join(self.config.heatmap_dir, self.config.test_file + "_" + str(self.device_type) + ".npz")
+            # the heatmaps are already on disk in the companion _heatmap.npy memmap
+            np.savez(heatmap_file, audio_name=audio_name, pred=pred, real_len=real_len)
+            finish_heatmap_shard(self)
         else:
             pred = torch.cat([d[0] for d in test_step_outputs], dim=0)
             target = torch.cat([d[1] for d in test_step_outputs], dim=0)
-            gather_pred = [torch.zeros_like(pred) for _ in range(dist.get_world_size())]
-            gather_target = [torch.zeros_like(target) for _ in range(dist.get_world_size())]
-            dist.all_gather(gather_pred, pred)
-            dist.all_gather(gather_target, target)
-            gather_pred = torch.cat(gather_pred, dim=0).cpu().numpy()
-            gather_target = torch.cat(gather_target, dim=0).cpu().numpy()
             if self.config.dataset_type == "scv2":
-                gather_target = np.argmax(gather_target, 1)
-            metric_dict = self.evaluate_metric(gather_pred, gather_target)
+                # decode the one-hot target on GPU before the gather, shrinking
+                # the collective payload from (N, C) to (N,)
+                target = target.argmax(dim=1)
+            gather_pred, gather_target = all_gather_pred_target(pred, target)
+            metric_dict = evaluate_on_rank_zero(self, gather_pred, gather_target)
             print(self.device_type, dist.get_world_size(), metric_dict, flush=True)
             if self.config.dataset_type == "audioset":
                 self.log("mAP", metric_dict["mAP"] * float(dist.get_world_size()), on_epoch=True, prog_bar=True, sync_dist=True)
@@ -259,18 +438,8 @@ class Ensemble_SEDWrapper(pl.LightningModule):
             lr=self.config.learning_rate, 
             betas=(0.9, 0.999), eps=1e-08, weight_decay=0.05
         )
-        def lr_foo(epoch):       
-            if epoch < 3:
-                lr_scale = self.config.lr_rate[epoch]
-            else:
-                lr_pos = int(-1 - bisect.bisect_left(self.config.lr_scheduler_epoch, epoch))
-                if lr_pos < -3:
-                    lr_scale = max(self.config.lr_rate[0] * (0.98 ** epoch), 0.03)
-                else:
-                    lr_scale = self.config.lr_rate[lr_pos]
-            return lr_scale
         scheduler = optim.lr_scheduler.LambdaLR(
             optimizer,
-            lr_lambda=lr_foo
+            lr_lambda=build_lr_lambda(self.config)
         )
         return [optimizer], [scheduler]